@@ -19,6 +19,7 @@
 
 
 from VisualPIC.DataReading.folderDataReader import FolderDataReader
+from VisualPIC.DataReading.rawDataReaders import RawDataReaderBase, OpenPMDRawDataReader
 from VisualPIC.DataHandling.customDataElements import CustomFieldCreator, CustomRawDataSetCreator
 from VisualPIC.DataHandling.dataElement import DataElement
 import VisualPIC.DataHandling.unitConverters as unitConverters
@@ -220,6 +221,11 @@ class DataContainer:
         return commonlyAvailableFields
 
     def ClearData(self):
+        # Release the files kept open by the data readers
+        for species in self._availableSpecies:
+            species.CloseFiles()
+        RawDataReaderBase.ClearCaches()
+        OpenPMDRawDataReader.ClearCaches()
         self._availableSpecies = list()
         self._availableDomainFields = list()
         self._selectedSpecies = list()
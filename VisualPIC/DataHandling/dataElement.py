@@ -47,6 +47,10 @@ class DataElement(object):
     def GetFirstTimeStep(self):
         return self.timeSteps[0]
 
+    def CloseFiles(self):
+        # Only needed by data elements which keep files open
+        pass
+
     def GetSimulationCellSizeInOriginalUnits(self):
         return self.dataReader.grid_size/self.dataReader.grid_resolution
 
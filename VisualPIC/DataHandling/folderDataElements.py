@@ -147,6 +147,9 @@ class FolderRawDataSet(FolderDataElement):
     def GetDataInOriginalUnits(self, timeStep):
         return self.dataReader.GetData(timeStep)
 
+    def CloseFiles(self):
+        self.dataReader.CloseFiles()
+
     """
     Get data in any units
     """
@@ -31,4 +31,7 @@ class RawDataTags(object):
         return self.timeSteps
 
     def GetTags(self, timeStep):
-        return self.dataReader.GetData(timeStep)
\ No newline at end of file
+        return self.dataReader.GetData(timeStep)
+
+    def CloseFiles(self):
+        self.dataReader.CloseFiles()
\ No newline at end of file
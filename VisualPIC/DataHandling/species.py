@@ -71,6 +71,12 @@ class Species:
     def GetRawDataTags(self, timeStep):
         return self.rawDataTags.GetTags(timeStep)
 
+    def CloseFiles(self):
+        for dataSet in self.rawDataSets:
+            dataSet.CloseFiles()
+        if self.hasRawDataTags:
+            self.rawDataTags.CloseFiles()
+
     def GetRawDataTimeSteps(self):
         """ Assumes all RawDataSets have the same number of time steps)"""
         return self.rawDataSets[0].GetTimeSteps()
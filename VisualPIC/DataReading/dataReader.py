@@ -21,9 +21,11 @@
 import abc
 
 
-class DataReader(object):
+class DataReader(object, metaclass=abc.ABCMeta):
     """Parent class for all data readers (fieldReaders and rawDataReaders)"""
-    __metaclass__  = abc.ABCMeta
+    __slots__ = ('location', 'speciesName', 'dataName', 'internalName',
+                 'currentTimeStep', 'currentTime', 'timeUnits', 'dataUnits',
+                 'data')
     def __init__(self, location, speciesName, dataName, internalName = ""):
         self.location = location
         self.speciesName = speciesName
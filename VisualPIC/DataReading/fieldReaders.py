@@ -38,7 +38,6 @@ except ImportError:
 
 class FieldReaderBase(DataReader):
     """Parent class for all FieldReaders"""
-    __metaclass__  = abc.ABCMeta
     def __init__(self, location, speciesName, dataName, firstTimeStep):
         DataReader.__init__(self, location, speciesName, dataName)
         self.internalName = ""
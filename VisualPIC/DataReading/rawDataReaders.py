@@ -19,124 +19,446 @@
 
 
 import abc
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from h5py import File as H5File
 import numpy as np
 
 from VisualPIC.DataReading.dataReader import DataReader
 
-# Try to import openPMD-viewer (required for openPMD data)
-try:
-    from opmd_viewer import OpenPMDTimeSeries
-    openpmd_installed = True
-except ImportError:
-    openpmd_installed = False
+# Number of particles from which the Cantor pairing is computed with numba
+# (if installed). Below it, NumPy is faster than calling the parallel kernel.
+_numba_min_particles = 1000000
+# numba kernel of the Cantor pairing. It is compiled on first use, to avoid
+# importing numba when it is not needed (False if numba is not installed).
+_cantor_kernel = None
+# Replaced by numba.prange when the kernel is compiled
+_prange = range
+# The kernel may be called from several threads (e.g. the prefetching of
+# different readers), and the workqueue threading layer of numba (used when
+# TBB and OpenMP are not available) aborts on concurrent calls
+_cantor_lock = threading.Lock()
+
+def _CantorPairingLoop(tags, data):
+    # Single pass over memory, vectorized and run on all cores by numba
+    for i in _prange(tags.shape[0]):
+        s = tags[i,0] + tags[i,1]
+        data[i] = ((s*(s+1)) >> 1) + tags[i,1]
+
+def _CantorPairingNumpy(tags, data):
+    # In-place version; the first column of `tags` is used as scratch
+    a = tags[:,0]
+    b = tags[:,1]
+    np.add(a, b, out=data)
+    np.add(data, 1, out=a)
+    data *= a
+    data >>= 1 # s*(s+1) is always even
+    data += b
+
+def _GetCantorKernel():
+    global _cantor_kernel, _prange
+    if _cantor_kernel is None:
+        try:
+            import numba
+        except ImportError:
+            _cantor_kernel = False
+        else:
+            _prange = numba.prange
+            _cantor_kernel = numba.njit(parallel=True, cache=True)(_CantorPairingLoop)
+    return _cantor_kernel
+
+def _CantorPairing(tags, data):
+    # Cantor pairing function of the two columns of `tags`, stored in `data`
+    if tags.shape[0] >= _numba_min_particles:
+        kernel = _GetCantorKernel()
+        if kernel:
+            with _cantor_lock:
+                kernel(tags, data)
+            return
+    _CantorPairingNumpy(tags, data)
+
+
+def _GetMPICommunicator():
+    # Returns MPI.COMM_WORLD for parallel reading. mpi4py is only imported
+    # here, since importing it initializes MPI.
+    try:
+        from mpi4py import MPI
+    except ImportError:
+        raise RuntimeError("Parallel reading requires mpi4py, e.g. install it with:\n"
+            "pip install mpi4py")
+    return MPI.COMM_WORLD
+
+
+# Reader owned by each worker process of RawDataReaderBase.GetDataBatch
+_batch_reader = None
+
+def _InitBatchWorker(readerClass, readerArgs):
+    global _batch_reader
+    _batch_reader = readerClass(*readerArgs)
+
+def _ReadBatchTimeStep(timeStep):
+    return timeStep, _batch_reader._ReadData(timeStep)
 
 
 class RawDataReaderBase(DataReader):
-    """Parent class for all rawDataReaders"""
-    __metaclass__  = abc.ABCMeta
-    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep):
+    """Parent class for all rawDataReaders
+
+    Files are opened with libver='latest' and a custom chunk cache size,
+    which requires h5py 2.9 (HDF5 1.8) or higher.
+    """
+    __slots__ = ('firstTimeStep', 'chunkCacheSize', 'useMPI', 'grid_resolution',
+                 'grid_size', 'grid_units', '_mpi_comm', '_file_cache',
+                 '_units_read', '_times', '_tag_buf', '_prefetch_executor',
+                 '_prefetch', '_read_lock')
+    # Maximum number of files (time steps) kept open by each reader
+    maxOpenFiles = 4
+    # Upper limit of the default HDF5 chunk cache size (bytes per file)
+    maxChunkCacheSize = 256*1024**2
+    # Data sets larger than this (in bytes) are read into memory-mapped files
+    memmapThreshold = 512*1024**2
+    # Data sets larger than this (in bytes) are not prefetched. It applies to
+    # each reader, and a species has one reader per quantity, so it is kept
+    # well below memmapThreshold.
+    maxPrefetchBytes = 32*1024**2
+    # Simulation properties shared by all readers of the same species
+    # (reader class, location, species name) -> properties
+    _simulation_properties = {}
+    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize=None, useMPI=False):
         DataReader.__init__(self, location, speciesName, dataName, internalName)
         self.internalName = dataName
         self.firstTimeStep = firstTimeStep
-        self._ReadBasicData()
+        # If None, the cache is as big as the file (up to maxChunkCacheSize)
+        self.chunkCacheSize = chunkCacheSize
+        # With useMPI, GetDataBatch distributes the time steps among the MPI
+        # ranks. All other reads are done independently by each rank.
+        self.useMPI = useMPI
+        self._mpi_comm = None
+        if useMPI:
+            self._mpi_comm = _GetMPICommunicator()
+        self._file_cache = OrderedDict() # file path -> open H5File
+        self._units_read = False
+        self._times = {} # time step -> time, for steps whose data was not read
+        self._tag_buf = None # scratch buffer for the raw (N,2) particle tags
+        self._prefetch_executor = None # created on first use
+        self._prefetch = {} # time step -> future with (data, time)
+        # Serializes file access between the GUI and the prefetching thread
+        self._read_lock = threading.RLock()
+        self._LoadBasicData()
+
+    @classmethod
+    def ClearCaches(cls):
+        # Must be called when the data is (re)loaded, since the simulation
+        # might have been rerun into the same folder
+        cls._simulation_properties.clear()
 
     def GetData(self, timeStep):
         if timeStep != self.currentTimeStep:
+            previousTimeStep = self.currentTimeStep
+            dataAndTime = self._GetPrefetched(timeStep)
+            if dataAndTime is None:
+                dataAndTime = self._ReadDataAndTime(timeStep)
             self.currentTimeStep = timeStep
-            self.data = self._ReadData(timeStep)
+            self.data, self.currentTime = dataAndTime
+            self._PrefetchNext(previousTimeStep, timeStep)
         return self.data
 
     def GetDataUnits(self):
-        if self.dataUnits == "":
-            self._ReadUnits()
+        if not self._units_read:
+            with self._read_lock:
+                self._ReadUnits()
+            self._units_read = True
         return self.dataUnits
 
     def GetTime(self, timeStep):
-        if timeStep != self.currentTimeStep:
-            self.currentTimeStep = timeStep
-            self._ReadTime(timeStep)
-        return self.currentTime
+        # The time of the current step is read together with its data
+        if timeStep == self.currentTimeStep:
+            return self.currentTime
+        if timeStep not in self._times:
+            with self._read_lock:
+                self._times[timeStep] = self._ReadTime(timeStep)
+        return self._times[timeStep]
 
     def GetTimeUnits(self):
-        if self.timeUnits == "":
-            self._ReadUnits()
+        if not self._units_read:
+            with self._read_lock:
+                self._ReadUnits()
+            self._units_read = True
         return self.timeUnits
 
+    def GetDataBatch(self, timeSteps, processes=None):
+        # Reads several time steps in parallel. Each worker process creates
+        # its own reader (and therefore its own file handles), which avoids
+        # the global lock of the HDF5 library. The data is returned in the
+        # same order as timeSteps.
+        # Note that the data is sent back from the workers by pickling, so
+        # the results are always stored in regular memory, even those larger
+        # than memmapThreshold.
+        timeSteps = list(timeSteps)
+        if self._mpi_comm is not None:
+            return self._GetDataBatchMPI(timeSteps)
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = min(processes, len(timeSteps))
+        if processes < 2:
+            with self._read_lock:
+                return [self._ReadData(timeStep) for timeStep in timeSteps]
+        # The workers are started as new interpreters rather than forked,
+        # since forking a process which runs other threads (Qt, prefetching,
+        # numba) can leave it deadlocked
+        context = multiprocessing.get_context("spawn")
+        readerArgs = self._GetReaderArgs()
+        chunkSize = max(1, len(timeSteps) // (4*processes))
+        data = {}
+        with context.Pool(processes, initializer=_InitBatchWorker,
+                          initargs=(type(self), readerArgs)) as pool:
+            for timeStep, stepData in pool.imap_unordered(_ReadBatchTimeStep, timeSteps, chunkSize):
+                data[timeStep] = stepData
+        return [data[timeStep] for timeStep in timeSteps]
+
+    def GetDataMulti(self, internalNames, timeStep):
+        # Reads several quantities of the species (e.g. ["x1", "p1", "q"])
+        # in one access to the file. Returns a dict: name -> data.
+        with self._read_lock:
+            return self._ReadDataMulti(list(internalNames), timeStep)
+
+    def CloseFiles(self):
+        # Stop prefetching first, so that no file is reopened afterwards
+        for future in self._prefetch.values():
+            future.cancel()
+        self._prefetch.clear()
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=True)
+            self._prefetch_executor = None
+        with self._read_lock:
+            while self._file_cache:
+                self._file_cache.popitem()[1].close()
+
+    def _GetReaderArgs(self):
+        # Arguments to create an equivalent reader which does not use MPI
+        return (self.location, self.speciesName, self.dataName,
+                self.internalName, self.firstTimeStep, self.chunkCacheSize,
+                False)
+
+    def _GetDataBatchMPI(self, timeSteps):
+        # Each rank reads its share of the time steps and the results are
+        # then exchanged among ranks.
+        rank = self._mpi_comm.Get_rank()
+        size = self._mpi_comm.Get_size()
+        with self._read_lock:
+            localData = [(timeStep, self._ReadData(timeStep))
+                         for timeStep in timeSteps[rank::size]]
+        data = {}
+        for rankData in self._mpi_comm.allgather(localData):
+            data.update(rankData)
+        return [data[timeStep] for timeStep in timeSteps]
+
+    def _ReadDataAndTime(self, timeStep):
+        with self._read_lock:
+            return self._ReadData(timeStep), self._ReadTime(timeStep)
+
+    def _PrefetchNext(self, previousTimeStep, timeStep):
+        # Guess the next time step from the last two requests (e.g. during
+        # playback or when moving the time slider step by step) and read it
+        # in a background thread. h5py releases the GIL while reading.
+        if previousTimeStep is None or previousTimeStep == timeStep:
+            return
+        # Do not keep a second copy of large data sets in memory
+        if self.data.nbytes > self.maxPrefetchBytes:
+            return
+        nextTimeStep = 2*timeStep - previousTimeStep
+        if nextTimeStep < 0:
+            return
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        for future in self._prefetch.values():
+            future.cancel()
+        future = self._prefetch_executor.submit(self._ReadDataAndTime, nextTimeStep)
+        self._prefetch = {nextTimeStep: future}
+
+    def _GetPrefetched(self, timeStep):
+        future = self._prefetch.pop(timeStep, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception:
+            # The guessed time step might not exist. Read again in the
+            # foreground so that any real error is raised to the caller.
+            return None
+
+    def _LoadBasicData(self):
+        # The simulation properties are the same for all the data sets of a
+        # species, so they are only read from file by the first reader.
+        key = (type(self), self.location, self.speciesName)
+        properties = RawDataReaderBase._simulation_properties.get(key)
+        if properties is None:
+            self._ReadBasicData()
+            properties = (self.grid_resolution, self.grid_size, self.grid_units)
+            RawDataReaderBase._simulation_properties[key] = properties
+        # Each reader gets its own copy of the arrays
+        self.grid_resolution, self.grid_size, self.grid_units = [
+            p.copy() if isinstance(p, np.ndarray) else p for p in properties]
+
+    def _OpenFile(self, timeStep):
+        # Files are kept open and reused, since opening an HDF5 file (and
+        # parsing its metadata) is much more expensive than reading from it.
+        # The least recently used file is closed when the cache is full.
+        file_path = self._GetFilePath(timeStep)
+        if file_path in self._file_cache:
+            self._file_cache.move_to_end(file_path)
+            return self._file_cache[file_path]
+        # The default chunk cache (1 MiB) is much smaller than the particle
+        # datasets, which makes HDF5 read (and decompress) chunks repeatedly.
+        chunkCacheSize = self.chunkCacheSize
+        if chunkCacheSize is None:
+            chunkCacheSize = min(self.maxChunkCacheSize, os.path.getsize(file_path))
+        file_content = H5File(file_path, 'r', libver='latest',
+                              rdcc_nbytes=chunkCacheSize, rdcc_nslots=10007)
+        self._file_cache[file_path] = file_content
+        if len(self._file_cache) > self.maxOpenFiles:
+            self._file_cache.popitem(last=False)[1].close()
+        return file_content
+
+    def _DecodeUnits(self, units):
+        # String attributes are stored as bytes in the HDF5 files
+        if isinstance(units, bytes):
+            units = units.decode('utf-8')
+        return units
+
+    def _AllocateBuffer(self, shape, dtype):
+        # Large arrays are backed by an anonymous temporary file, so that the
+        # OS can page them out under memory pressure instead of failing.
+        dtype = np.dtype(dtype)
+        if int(np.prod(shape))*dtype.itemsize <= self.memmapThreshold:
+            return np.empty(shape, dtype=dtype)
+        with tempfile.TemporaryFile() as buffer_file:
+            # The mapping stays valid after the file is closed (and deleted)
+            return np.memmap(buffer_file, dtype=dtype, shape=shape, mode='w+')
+
+    def _ReadDataSet(self, file_content, name):
+        # Read the whole dataset straight into a numpy buffer
+        dataset = file_content[name]
+        data = self._AllocateBuffer(dataset.shape, dataset.dtype)
+        dataset.read_direct(data)
+        return data
+
+    def _ReadTags(self, file_content, name):
+        # Each particle is identified by a pair of integers (node, index),
+        # which are merged into a single number with the Cantor pairing
+        # function. The tags are always returned as int64.
+        dataset = file_content[name]
+        if dataset.dtype.kind not in 'iu':
+            raise TypeError("Particle tags must be integers, but '{}' has "
+                            "type {}".format(name, dataset.dtype))
+        # The raw tags are read into a buffer which is reused between calls
+        # and only reallocated when the number of particles grows. Buffers
+        # larger than memmapThreshold are not kept between calls. HDF5
+        # converts narrower integer types to int64 during the read itself.
+        n = dataset.shape[0]
+        if 2*n*np.dtype(np.int64).itemsize > self.memmapThreshold:
+            self._tag_buf = None
+            tags = self._AllocateBuffer((n, 2), np.int64)
+        else:
+            if self._tag_buf is None or self._tag_buf.shape[0] < n:
+                self._tag_buf = self._AllocateBuffer((n, 2), np.int64)
+            tags = self._tag_buf[:n]
+        dataset.read_direct(tags)
+        data = self._AllocateBuffer((n,), np.int64)
+        _CantorPairing(tags, data)
+        return data
+
+    @abc.abstractmethod
+    def _ReadData(self, timeStep):
+        raise NotImplementedError
+
     @abc.abstractmethod
     def _ReadBasicData(self):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def _GetFilePath(self, timeStep):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _ReadDataMulti(self, internalNames, timeStep):
+        raise NotImplementedError
+
 
-class OsirisRawDataReader(RawDataReaderBase):
-    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep):
-        RawDataReaderBase.__init__(self, location, speciesName, dataName, internalName, firstTimeStep)
+class H5RawDataReaderBase(RawDataReaderBase):
+    """Parent class for the readers of OSIRIS and HiPACE raw data, which
+    store each time step in its own file with one data set per quantity
+    """
+    __slots__ = ('_file_prefix', '_data_set_reader')
+    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize=None, useMPI=False):
+        # _file_prefix has to be set by the subclass before calling this
+        RawDataReaderBase.__init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize, useMPI)
+        # The data set never changes, so its read function is chosen only once
+        self._data_set_reader = self._GetDataSetReader(self.internalName)
 
     def _ReadData(self, timeStep):
         file_content = self._OpenFile(timeStep)
-        if self.internalName == "tag":
-            tags = np.array(file_content.get(self.internalName))
-            a = tags[:,0]
-            b = tags[:,1]
-            data = 1/2*(a+b)*(a+b+1)+b # Cantor pairing function
-        else:
-            data = np.array(file_content.get(self.internalName))
-        self.currentTime = file_content.attrs["TIME"][0]
-        file_content.close()
-        return data
+        return self._data_set_reader(self, file_content, self.internalName)
 
-    def _ReadTime(self, timeStep):
+    def _ReadDataMulti(self, internalNames, timeStep):
         file_content = self._OpenFile(timeStep)
-        self.currentTime = file_content.attrs["TIME"][0]
-        file_content.close()
+        return {name: self._GetDataSetReader(name)(self, file_content, name)
+                for name in internalNames}
 
-    def _ReadUnits(self):
-        file_content = self._OpenFile(self.firstTimeStep)
-        self.dataUnits = str(list(file_content[self.internalName].attrs["UNITS"])[0])[2:-1].replace("\\\\","\\")
-        self.timeUnits = str(file_content.attrs["TIME UNITS"][0])[2:-1].replace("\\\\","\\")
-        file_content.close()
+    def _GetDataSetReader(self, name):
+        # Returns the (unbound) function which reads the data set `name`.
+        # Data sets without an entry in _dataSetReaders are read as stored.
+        return self._dataSetReaders.get(name, RawDataReaderBase._ReadDataSet)
+
+    def _ReadTime(self, timeStep):
+        file_content = self._OpenFile(timeStep)
+        return file_content.attrs["TIME"][0]
 
     def _ReadSimulationProperties(self, file_content):
         self.grid_resolution = np.array(file_content.attrs['NX'])
         self.grid_size = np.array(file_content.attrs['XMAX']) - np.array(file_content.attrs['XMIN'])
         self.grid_units = 'c/ \omega_p'
 
-    def _OpenFile(self, timeStep):
-        fileName = "RAW-" + self.speciesName + "-" + str(timeStep).zfill(6)
-        ending = ".h5"
-        file_path = self.location + "/" + fileName + ending
-        file_content = H5File(file_path, 'r')
-        return file_content
+    def _GetFilePath(self, timeStep):
+        return "{}{:06d}.h5".format(self._file_prefix, timeStep)
 
     def _ReadBasicData(self):
         file_content = self._OpenFile(self.firstTimeStep)
         self._ReadSimulationProperties(file_content)
-        file_content.close()
 
+    # Functions reading the data sets which need special treatment
+    _dataSetReaders = {"tag": RawDataReaderBase._ReadTags}
 
-class HiPACERawDataReader(RawDataReaderBase):
-    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep):
-        RawDataReaderBase.__init__(self, location, speciesName, dataName, internalName, firstTimeStep)
 
-    def _ReadData(self, timeStep):
-        file_content = self._OpenFile(timeStep)
-        if self.internalName == "tag":
-            tags = np.array(file_content.get(self.internalName))
-            a = tags[:,0]
-            b = tags[:,1]
-            data = 1/2*(a+b)*(a+b+1)+b # Cantor pairing function
-        else:
-            data = np.array(file_content.get(self.internalName))
-        self.currentTime = file_content.attrs["TIME"][0]
-        if self.internalName == "x1":
-            data += self.currentTime
-        file_content.close()
-        return data
+class OsirisRawDataReader(H5RawDataReaderBase):
+    __slots__ = ()
+    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize=None, useMPI=False):
+        # Common part of the path of the files of all time steps
+        self._file_prefix = location + "/RAW-" + speciesName + "-"
+        H5RawDataReaderBase.__init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize, useMPI)
 
-    def _ReadTime(self, timeStep):
-        file_content = self._OpenFile(timeStep)
-        self.currentTime = file_content.attrs["TIME"][0]
-        file_content.close()
+    def _ReadUnits(self):
+        file_content = self._OpenFile(self.firstTimeStep)
+        self.dataUnits = self._DecodeUnits(file_content[self.internalName].attrs["UNITS"][0])
+        self.timeUnits = self._DecodeUnits(file_content.attrs["TIME UNITS"][0])
+
+
+class HiPACERawDataReader(H5RawDataReaderBase):
+    __slots__ = ()
+    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize=None, useMPI=False):
+        # Common part of the path of the files of all time steps
+        self._file_prefix = location + "/raw_" + speciesName + "_"
+        H5RawDataReaderBase.__init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize, useMPI)
+
+    def _ReadX1(self, file_content, name):
+        # x1 is stored in the co-moving frame; adding the time gives the
+        # position in the laboratory frame
+        data = self._ReadDataSet(file_content, name)
+        data += file_content.attrs["TIME"][0]
+        return data
 
     def _ReadUnits(self):
         # No units information is currently stored by HiPACE
@@ -150,46 +472,61 @@ class HiPACERawDataReader(RawDataReaderBase):
             self.dataUnits = 'unknown'
         self.timeUnits = '1/ \omega_p'
 
-    def _OpenFile(self, timeStep):
-        fileName = "raw_" + self.speciesName + "_" + str(timeStep).zfill(6)
-        ending = ".h5"
-        file_path = self.location + "/" + fileName + ending
-        file_content = H5File(file_path, 'r')
-        return file_content
-
-    def _ReadSimulationProperties(self, file_content):
-        self.grid_resolution = np.array(file_content.attrs['NX'])
-        self.grid_size = np.array(file_content.attrs['XMAX']) - np.array(file_content.attrs['XMIN'])
-        self.grid_units = 'c/ \omega_p'
-
-    def _ReadBasicData(self):
-        file_content = self._OpenFile(self.firstTimeStep)
-        self._ReadSimulationProperties(file_content)
-        file_content.close()
+    _dataSetReaders = dict(H5RawDataReaderBase._dataSetReaders, x1=_ReadX1)
 
 class OpenPMDRawDataReader(RawDataReaderBase):
-    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep):
+    __slots__ = ('openpmd_ts', '_iter_index_cache')
+    # openPMD-viewer module, imported when the first reader is created
+    _opmd_viewer = None
+    # Timeseries shared by all the readers of the same location
+    _ts_cache = {}
+    # Serializes the use of the shared timeseries by the different readers
+    _ts_lock = threading.RLock()
+    def __init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize=None, useMPI=False):
         # First check whether openPMD is installed
-        if not openpmd_installed:
-            raise RunTimeError("You need to install openPMD-viewer, e.g. with:\n"
-                "pip install openPMD-viewer")
+        if OpenPMDRawDataReader._opmd_viewer is None:
+            try:
+                import opmd_viewer
+            except ImportError:
+                raise RuntimeError("You need to install openPMD-viewer, e.g. with:\n"
+                    "pip install openPMD-viewer")
+            OpenPMDRawDataReader._opmd_viewer = opmd_viewer
         # Store an openPMD timeseries object
         # (Its API is used in order to conveniently extract data from the file)
-        self.openpmd_ts = OpenPMDTimeSeries( location, check_all_files=False )
+        # Creating it scans the whole folder, so it is done only once for
+        # each location and shared by all the readers.
+        with OpenPMDRawDataReader._ts_lock:
+            if location not in OpenPMDRawDataReader._ts_cache:
+                OpenPMDRawDataReader._ts_cache[location] = \
+                    OpenPMDRawDataReader._opmd_viewer.OpenPMDTimeSeries(
+                        location, check_all_files=False )
+            self.openpmd_ts = OpenPMDRawDataReader._ts_cache[location]
+        self._iter_index_cache = {} # time step -> index in openpmd_ts
         # Initialize the instance
-        RawDataReaderBase.__init__(self, location, speciesName, dataName, internalName, firstTimeStep)
+        RawDataReaderBase.__init__(self, location, speciesName, dataName, internalName, firstTimeStep, chunkCacheSize, useMPI)
+
+    @classmethod
+    def ClearCaches(cls):
+        # New iterations might have been written since the timeseries were
+        # created, so they are created again when the data is (re)loaded
+        with cls._ts_lock:
+            cls._ts_cache.clear()
 
     def _ReadData(self, timeStep):
-        data, = self.openpmd_ts.get_particle( [self.internalName],
-                    species=self.speciesName, iteration=timeStep )
-        self.currentTime = self._ReadTime(timeStep)
+        with OpenPMDRawDataReader._ts_lock:
+            data, = self.openpmd_ts.get_particle( [self.internalName],
+                        species=self.speciesName, iteration=timeStep )
         return data
 
+    def _ReadDataMulti(self, internalNames, timeStep):
+        # openPMD-viewer reads all the requested quantities in a single call
+        with OpenPMDRawDataReader._ts_lock:
+            data = self.openpmd_ts.get_particle( internalNames,
+                        species=self.speciesName, iteration=timeStep )
+        return dict(zip(internalNames, data))
+
     def _ReadTime(self, timeStep):
-        # The line below sets the attribute `_current_i` of openpmd_ts
-        self.openpmd_ts._find_output( None, timeStep )
-        # This sets the corresponding time
-        self.currentTime = self.openpmd_ts.t[ self.openpmd_ts._current_i ]
+        return self.openpmd_ts.t[ self._FindIteration(timeStep) ]
 
     def _ReadUnits(self):
         # OpenPMD data always provide conversion to SI units
@@ -197,13 +534,22 @@ class OpenPMDRawDataReader(RawDataReaderBase):
         self.dataUnits = "arb.u." 
         self.timeUnits = "s"
 
-    def _OpenFile(self, timeStep):
-        # The line below sets the attribute `_current_i` of openpmd_ts
-        self.openpmd_ts._find_output( None, timeStep )
-        # This finds the full path to the corresponding file
-        fileName = self.openpmd_ts.h5_files[ self.openpmd_ts._current_i ]
-        file_content = H5File(fileName, 'r')
-        return file_content
+    def _GetFilePath(self, timeStep):
+        return self.openpmd_ts.h5_files[ self._FindIteration(timeStep) ]
+
+    def _FindIteration(self, timeStep):
+        # Returns the index of the time step in the lists of openpmd_ts.
+        # Finding it requires a search through all the files, so it is
+        # only done once for each time step.
+        i = self._iter_index_cache.get(timeStep)
+        if i is None:
+            # openpmd_ts is shared with other readers
+            with OpenPMDRawDataReader._ts_lock:
+                # The line below sets the attribute `_current_i` of openpmd_ts
+                self.openpmd_ts._find_output( None, timeStep )
+                i = self.openpmd_ts._current_i
+            self._iter_index_cache[timeStep] = i
+        return i
 
     def _ReadSimulationProperties(self, file_content):
         # TODO: Add the proper resolution
@@ -214,4 +560,3 @@ class OpenPMDRawDataReader(RawDataReaderBase):
     def _ReadBasicData(self):
         file_content = self._OpenFile(self.firstTimeStep)
         self._ReadSimulationProperties(file_content)
-        file_content.close()